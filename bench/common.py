@@ -0,0 +1,57 @@
+import configparser
+import os
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+import keyring
+import keyring.backend
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class MemoryKeyring(keyring.backend.KeyringBackend):
+    # Stands in for Secret Service/KWallet, delay is the D-Bus round trip
+    priority = 1
+
+    def __init__(self, delay=0.0):
+        super().__init__()
+        self.delay = delay
+
+    def get_password(self, service, username):
+        time.sleep(self.delay)
+        return 'secret'
+
+    def set_password(self, service, username, password):
+        pass
+
+    def delete_password(self, service, username):
+        pass
+
+
+def make_config(**sections):
+    config = configparser.RawConfigParser()
+    config.read_dict({'global': {'workday_begin': '10:00',
+                                 'workday_end': '19:00',
+                                 'launch_begin': '13:00',
+                                 'launch_end': '14:00',
+                                 'timezone': 'Europe/Moscow',
+                                 'date_format': '%d.%m.%Y',
+                                 'cache_dir': tempfile.mkdtemp(prefix='timer-bench-')},
+                      **sections})
+    return config
+
+
+@asynccontextmanager
+async def serve(app):
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    try:
+        yield f'http://{host}:{port}'
+    finally:
+        await runner.cleanup()
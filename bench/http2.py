@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import time
+
+import aiohttp
+import h2.config
+import h2.connection
+import h2.events
+import httpx
+
+from common import make_config
+import timer
+
+BODY = b'{"worklogs": []}'
+
+
+class StandInServer:
+    # Speaks HTTP/2 with prior knowledge and HTTP/1.1 keep-alive on the same port
+    def __init__(self, latency):
+        self.latency = latency
+        self.connections = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            first = await reader.read(65536)
+            if first.startswith(b'PRI'):
+                await self.handle_http2(first, reader, writer)
+            else:
+                await self.handle_http1(first, reader, writer)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle_http1(self, buffer, reader, writer):
+        while True:
+            while b'\r\n\r\n' not in buffer:
+                data = await reader.read(65536)
+                if not data:
+                    return
+                buffer += data
+            _, _, buffer = buffer.partition(b'\r\n\r\n')
+            await asyncio.sleep(self.latency)
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                         b'Content-Length: %d\r\n\r\n%s' % (len(BODY), BODY))
+            await writer.drain()
+
+    async def handle_http2(self, data, reader, writer):
+        connection = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        connection.initiate_connection()
+
+        async def respond(stream_id):
+            await asyncio.sleep(self.latency)
+            connection.send_headers(stream_id, [(':status', '200'),
+                                                ('content-type', 'application/json'),
+                                                ('content-length', str(len(BODY)))])
+            connection.send_data(stream_id, BODY, end_stream=True)
+            writer.write(connection.data_to_send())
+
+        responses = []
+        while data:
+            for event in connection.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    responses.append(asyncio.ensure_future(respond(event.stream_id)))
+                elif isinstance(event, h2.events.ConnectionTerminated):
+                    return
+            writer.write(connection.data_to_send())
+            await writer.drain()
+            data = await reader.read(65536)
+        for response in responses:
+            response.cancel()
+
+
+async def fan_out(transport, url, requests):
+    auth = aiohttp.BasicAuth('bench', 'secret')
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(transport.request('GET', f'{url}/rest/api/2/issue/{number}/worklog', auth=auth)
+                                       for number in range(requests)))
+    assert all(response.status == 200 for response in responses)
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Concurrent requests over HTTP/1.1 and HTTP/2 to one host')
+    parser.add_argument('--requests', type=int, default=64, help='Concurrent requests to one host')
+    parser.add_argument('--latency', type=float, default=0.05, help='Server latency per response in seconds')
+    args = parser.parse_args()
+
+    server = StandInServer(args.latency)
+    listener = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+    url = f'http://127.0.0.1:{listener.sockets[0].getsockname()[1]}'
+    config = make_config()
+    # The stand-in has no TLS, so HTTP/2 is spoken with prior knowledge instead of negotiated with ALPN
+    transports = {'aiohttp': timer.create_transport(config, timer.ConnectionStats()),
+                  'httpx h2': timer.HttpxTransport(httpx.AsyncClient(http1=False, http2=True))}
+    print(f'{args.requests} concurrent requests, {args.latency * 1000:.0f}ms per response, '
+          f'connections_per_host = {config.getint("global", "connections_per_host", fallback=8)}')
+    try:
+        for name, transport in transports.items():
+            server.connections = 0
+            elapsed = await fan_out(transport, url, args.requests)
+            print(f'{name:<9} {elapsed * 1000:>6.0f}ms over {server.connections} connections')
+    finally:
+        for transport in transports.values():
+            await transport.close()
+        listener.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
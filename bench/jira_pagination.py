@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import time
+from datetime import date, datetime
+
+import keyring
+from aiohttp import web
+
+from common import MemoryKeyring, make_config, serve
+import timer
+
+
+def make_issues(count, day, login):
+    return [{'id': str(number),
+             'key': f'BENCH-{number}',
+             'fields': {'worklog': {'total': 1,
+                                    'worklogs': [{'id': str(number),
+                                                  'author': {'name': login},
+                                                  'started': f'{day}T10:00:00.000+0000',
+                                                  'timeSpentSeconds': 600,
+                                                  'comment': f'Worklog {number}'}]}}}
+            for number in range(1, count + 1)]
+
+
+def make_app(issues, max_results, latency):
+    async def search(request):
+        await asyncio.sleep(latency)
+        start_at = int(request.query.get('startAt', 0))
+        # Like Jira Cloud, the server silently caps the requested page size
+        page_size = min(int(request.query.get('maxResults', 50)), max_results)
+        return web.json_response({'startAt': start_at,
+                                  'maxResults': page_size,
+                                  'total': len(issues),
+                                  'issues': issues[start_at:start_at + page_size]})
+
+    app = web.Application()
+    app.router.add_get('/rest/api/2/search', search)
+    return app
+
+
+async def run(url, report_date, concurrency, page_size):
+    config = make_config(jira={'url': url,
+                               'login': 'bench',
+                               'concurrency': str(concurrency),
+                               'page_size': str(page_size),
+                               'rate_limit': '100000'})
+    transport = timer.create_transport(config, timer.ConnectionStats())
+    try:
+        jira, = await timer.create_systems([timer.Jira], config, report_date, transport=transport)
+        started = time.perf_counter()
+        await jira.get_entries()
+        return time.perf_counter() - started, len(jira.entries), jira.requests
+    finally:
+        await transport.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Jira search pagination against a local mock')
+    parser.add_argument('--issues', type=int, default=5000, help='Matching issues on the mock server')
+    parser.add_argument('--max-results', type=int, default=100, help='Page size cap of the mock server')
+    parser.add_argument('--latency', type=float, default=0.02, help='Server latency per page in seconds')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    keyring.set_keyring(MemoryKeyring())
+    report_date = datetime.combine(date.today(), datetime.min.time())
+    issues = make_issues(args.issues, report_date.strftime('%Y-%m-%d'), 'bench')
+    async with serve(make_app(issues, args.max_results, args.latency)) as url:
+        print(f'{args.issues} issues, pages capped at {args.max_results}, {args.latency * 1000:.0f}ms per page')
+        print(f'Single request with maxResults=1000 (before pagination): {min(args.max_results, args.issues)} issues')
+        print(f'{"concurrency":>11} {"time":>9} {"worklogs":>9} {"requests":>9}')
+        for concurrency in args.concurrency:
+            elapsed, worklogs, requests = await run(url, report_date, concurrency, 1000)
+            print(f'{concurrency:>11} {elapsed * 1000:>7.0f}ms {worklogs:>9} {requests:>9}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
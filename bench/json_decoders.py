@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import timeit
+
+import common  # noqa: F401 puts timer.py on the path
+import timer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def make_payloads(count):
+    # Shaped like real responses of each backend
+    jira = {'startAt': 0, 'maxResults': count, 'total': count, 'issues': [
+        {'id': str(number), 'key': f'PROJ-{number}', 'self': f'https://jira.example.com/rest/api/2/issue/{number}',
+         'fields': {'worklog': {'startAt': 0, 'maxResults': 20, 'total': 3, 'worklogs': [
+             {'id': f'{number}{worklog}', 'issueId': str(number),
+              'author': {'name': 'user', 'displayName': 'Some User', 'active': True},
+              'comment': 'Investigated the issue and updated the ticket with findings',
+              'started': '2020-01-01T10:00:00.000+0300', 'timeSpent': '1h', 'timeSpentSeconds': 3600}
+             for worklog in range(3)]}}}
+        for number in range(count)]}
+    freshdesk = [{'id': number, 'ticket_id': 1000 + number, 'agent_id': 1, 'billable': number % 2 == 0,
+                  'time_spent': '01:30', 'note': 'Answered customer question UPDATE',
+                  'executed_at': '2020-01-01T10:00:00Z', 'created_at': '2020-01-01T10:00:00Z',
+                  'updated_at': '2020-01-01T10:00:00Z', 'timer_running': False}
+                 for number in range(count)]
+    teamwork = {'timelogs': [{'id': number, 'minutes': 90, 'isBillable': True, 'taskId': number % 50,
+                              'projectId': number % 5, 'timeLogged': '2020-01-01T10:00:00Z'}
+                             for number in range(count)],
+                'meta': {'page': {'pageOffset': 0, 'pageSize': count, 'count': count, 'hasMore': False}},
+                'included': {'projects': {str(number): {'id': number, 'name': f'Project {number}'}
+                                          for number in range(5)},
+                             'tasks': {str(number): {'id': number, 'name': f'Task {number}'}
+                                       for number in range(50)}}}
+    return {f'jira search, {count} issues': json.dumps(jira).encode(),
+            f'freshdesk time entries, {count}': json.dumps(freshdesk).encode(),
+            f'teamwork timelogs, {count}': json.dumps(teamwork).encode()}
+
+
+def load_recorded(path):
+    # Bodies of the response cache, e.g. ~/.cache/timer/http
+    payloads = {}
+    for name in sorted(os.listdir(path)):
+        with open(os.path.join(path, name), 'rb') as f:
+            f.readline()
+            payloads[name[:12]] = f.read()
+    return payloads
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare JSON decoders on backend payloads')
+    parser.add_argument('--recorded', type=str,
+                        help='Directory of recorded responses, e.g. the http folder in cache_dir')
+    parser.add_argument('--count', type=int, default=1000, help='Records per generated payload')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    decoders = {'json': json.loads}
+    if orjson is not None:
+        decoders['orjson'] = orjson.loads
+    else:
+        print('orjson is not installed, only the stdlib decoder is measured')
+    print(f'timer.py decodes with {timer.json_loads.__module__}')
+
+    payloads = load_recorded(os.path.expanduser(args.recorded)) if args.recorded else make_payloads(args.count)
+    print(f'{"payload":<32} {"size":>9}' + ''.join(f'{name:>10}' for name in decoders))
+    for name, body in payloads.items():
+        times = [min(timeit.repeat(lambda: decode(body), number=1, repeat=args.repeat))
+                 for decode in decoders.values()]
+        print(f'{name:<32} {len(body) // 1024:>7}kB' + ''.join(f'{elapsed * 1000:>8.2f}ms' for elapsed in times))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import date, datetime
+
+import keyring
+from aiohttp import web
+
+from common import MemoryKeyring, make_config, serve
+import timer
+
+
+def make_app():
+    async def search(request):
+        return web.json_response({'startAt': 0, 'maxResults': 100, 'total': 0, 'issues': []})
+
+    app = web.Application()
+    app.router.add_get('/rest/api/2/search', search)
+    return app
+
+
+async def start_proxy(target_port, handshake):
+    # Every new connection pays the TCP and TLS handshake of a remote server
+    async def pipe(reader, writer):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle(client_reader, client_writer):
+        await asyncio.sleep(handshake)
+        server_reader, server_writer = await asyncio.open_connection('127.0.0.1', target_port)
+        await asyncio.gather(pipe(client_reader, server_writer), pipe(server_reader, client_writer))
+
+    return await asyncio.start_server(handle, '127.0.0.1', 0)
+
+
+async def first_response(url, report_date, warm):
+    started = time.perf_counter()
+    config = make_config(jira={'url': url, 'login': 'bench'})
+    transport = timer.create_transport(config, timer.ConnectionStats())
+    warm_up_tasks = timer.warm_up(transport, config, ['jira']) if warm else []
+    try:
+        jira, = await timer.create_systems([timer.Jira], config, report_date, transport=transport)
+        await jira.get_json()
+        return time.perf_counter() - started
+    finally:
+        for task in warm_up_tasks:
+            task.cancel()
+        await transport.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Time to first response with and without connection warm-up')
+    parser.add_argument('--keyring-delay', type=float, default=0.3, help='Keyring lookup time in seconds')
+    parser.add_argument('--handshake', type=float, default=0.15, help='Connection setup time in seconds')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    keyring.set_keyring(MemoryKeyring(args.keyring_delay))
+    report_date = datetime.combine(date.today(), datetime.min.time())
+    async with serve(make_app()) as url:
+        proxy = await start_proxy(int(url.rpartition(':')[2]), args.handshake)
+        proxy_url = f'http://127.0.0.1:{proxy.sockets[0].getsockname()[1]}'
+        print(f'Keyring lookup {args.keyring_delay * 1000:.0f}ms, connection setup {args.handshake * 1000:.0f}ms')
+        for name, warm in (('serial', False), ('warm-up', True)):
+            runs = [await first_response(proxy_url, report_date, warm) for _ in range(args.runs)]
+            print(f'{name:<8} first response after {statistics.median(runs) * 1000:.0f}ms (median of {args.runs})')
+        proxy.close()
+        await proxy.wait_closed()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
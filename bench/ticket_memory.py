@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import json
+import tracemalloc
+
+import keyring
+from aiohttp import web
+
+from common import MemoryKeyring, make_config, serve
+import timer
+
+PER_PAGE = 100
+
+
+def make_app(ticket_sizes):
+    # Pages are encoded up front so the mock adds nothing to the traced peak
+    pages = {ticket: [json.dumps([{'id': number, 'ticket_id': ticket, 'billable': number % 3 != 0,
+                                   'time_spent': '00:15', 'note': f'Entry {number} UPDATE',
+                                   'updated_at': '2020-01-01T10:00:00Z'}
+                                  for number in range(start, min(start + PER_PAGE, size))]).encode()
+                      for start in range(0, size, PER_PAGE)]
+             for ticket, size in ticket_sizes.items()}
+
+    async def time_entries(request):
+        ticket_pages = pages[int(request.match_info['ticket'])]
+        page = int(request.query.get('page', 1))
+        headers = {'Content-Type': 'application/json'}
+        if page < len(ticket_pages):
+            url = request.url.update_query({'page': page + 1, 'per_page': PER_PAGE})
+            headers['Link'] = f'<{url}>; rel="next"'
+        return web.Response(body=ticket_pages[page - 1], headers=headers)
+
+    app = web.Application()
+    app.router.add_get('/api/v2/tickets/{ticket}/time_entries', time_entries)
+    return app
+
+
+async def keep_all(fd, ticket):
+    # What get_ticket did before: every raw dict stays alive until the totals are printed
+    fd.api_url = f'{fd.url}/api/v2/tickets/{ticket}/time_entries'
+    fd.params = None
+    fd.json = [data async for page in fd.get_pages() for data in page]
+    fd.entries = [fd.__parse_entry__(data) for data in fd.json]
+    return sum(entry.spent for entry in fd.entries)
+
+
+async def measure(transport, config, ticket, streaming):
+    fd, = await timer.create_systems([timer.Freshdesk], config, transport=transport)
+    tracemalloc.start()
+    try:
+        await (fd.get_ticket(ticket) if streaming else keep_all(fd, ticket))
+        return tracemalloc.get_traced_memory()[1], fd.requests
+    finally:
+        tracemalloc.stop()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Peak memory of Freshdesk ticket totals against a local mock')
+    parser.add_argument('--entries', type=int, nargs='+', default=[1000, 5000, 20000])
+    args = parser.parse_args()
+
+    keyring.set_keyring(MemoryKeyring())
+    async with serve(make_app(dict(enumerate(args.entries, start=1)))) as url:
+        config = make_config(freshdesk={'url': url, 'agent_id': '1', 'free_tags': 'UPDATE', 'rate_limit': '100000'})
+        transport = timer.create_transport(config, timer.ConnectionStats())
+        try:
+            # Page by page still keeps a RequestTiming per request for --timings
+            print(f'{"entries":>8} {"requests":>9} {"kept in memory":>15} {"page by page":>13}')
+            for ticket, size in enumerate(args.entries, start=1):
+                kept, _ = await measure(transport, config, ticket, streaming=False)
+                streamed, requests = await measure(transport, config, ticket, streaming=True)
+                print(f'{size:>8} {requests:>9} {kept / 1024:>13.0f}kB {streamed / 1024:>11.0f}kB')
+        finally:
+            await transport.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -3,15 +3,45 @@
 import argparse
 import asyncio
 import configparser
+import hashlib
+import json
+import math
 import os
+import random
+import re
+import sqlite3
+import threading
 from collections import namedtuple
 from dataclasses import dataclass, field
-from datetime import datetime, date, timedelta
+from datetime import datetime, date, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from functools import partial
+from time import monotonic
+from urllib.parse import urlsplit
 from typing import List, Tuple, Dict
 
 import aiohttp
 import keyring
 import pytz
+from multidict import CIMultiDict
+
+try:
+    # Optional HTTP/2 transport
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    # Optional non-blocking DNS resolver for aiohttp
+    import aiodns
+except ImportError:
+    aiodns = None
+
+try:
+    # Decodes straight from response bytes and is several times faster than json
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 
 @dataclass(order=True)
@@ -104,6 +134,720 @@ class Entry(object):
     billable: bool
     spent: Time
     note: str = ''
+    uid: str = None
+
+
+@dataclass
+class ConnectionStats:
+    handshakes: int = 0
+    reused: int = 0
+
+    def trace_config(self):
+        async def on_connection_create_end(session, context, params):
+            self.handshakes += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            self.reused += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    def __str__(self):
+        return f'Connections: {self.handshakes} opened, {self.reused} reused'
+
+
+PHASES = ('queue', 'dns', 'connect', 'ttfb', 'transfer')
+
+
+@dataclass
+class RequestTiming:
+    url: str
+    start: float = 0.0
+    queue: float = 0.0
+    dns: float = 0.0
+    connect: float = 0.0
+    ttfb: float = 0.0
+    transfer: float = 0.0
+    size: int = 0
+    marks: Dict[str, float] = field(default_factory=dict)
+
+    def begin(self, phase):
+        self.marks[phase] = monotonic()
+
+    def end(self, phase):
+        if phase in self.marks:
+            setattr(self, phase, getattr(self, phase) + monotonic() - self.marks.pop(phase))
+
+    def get_total(self):
+        return sum(getattr(self, phase) for phase in PHASES)
+
+
+def timing_trace_config():
+    def get_timing(context):
+        # Requests made without a RequestTiming, e.g. connection warm-up, are not timed
+        timing = context.trace_request_ctx
+        return timing if isinstance(timing, RequestTiming) else None
+
+    async def on_request_start(session, context, params):
+        timing = get_timing(context)
+        if timing:
+            timing.start = monotonic()
+            timing.begin('ttfb')
+
+    async def on_phase_start(phase, session, context, params):
+        timing = get_timing(context)
+        if timing:
+            timing.begin(phase)
+
+    async def on_phase_end(phase, session, context, params):
+        timing = get_timing(context)
+        if timing:
+            timing.end(phase)
+
+    async def on_connection_create_end(session, context, params):
+        timing = get_timing(context)
+        if timing:
+            # DNS resolution happens inside connection setup
+            timing.end('connect')
+            timing.connect -= timing.dns
+
+    async def on_request_end(session, context, params):
+        timing = get_timing(context)
+        if timing:
+            timing.end('ttfb')
+            timing.ttfb -= timing.queue + timing.dns + timing.connect
+            timing.begin('transfer')
+
+    async def on_response_chunk_received(session, context, params):
+        timing = get_timing(context)
+        if timing:
+            timing.size += len(params.chunk)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_queued_start.append(partial(on_phase_start, 'queue'))
+    trace_config.on_connection_queued_end.append(partial(on_phase_end, 'queue'))
+    trace_config.on_dns_resolvehost_start.append(partial(on_phase_start, 'dns'))
+    trace_config.on_dns_resolvehost_end.append(partial(on_phase_end, 'dns'))
+    trace_config.on_connection_create_start.append(partial(on_phase_start, 'connect'))
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_response_chunk_received.append(on_response_chunk_received)
+    return trace_config
+
+
+def create_session(config, connection_stats):
+    # Zero TTL keeps resolved hosts for the whole lifetime of the process
+    dns_cache_ttl = config.getint('global', 'dns_cache_ttl', fallback=300) or None
+    resolver = None
+    if aiodns is not None and config.getboolean('global', 'async_dns', fallback=True):
+        resolver = aiohttp.AsyncResolver()
+    connector = aiohttp.TCPConnector(limit=config.getint('global', 'connections', fallback=100),
+                                     limit_per_host=config.getint('global', 'connections_per_host', fallback=8),
+                                     keepalive_timeout=config.getint('global', 'keepalive_timeout', fallback=30),
+                                     use_dns_cache=True,
+                                     ttl_dns_cache=dns_cache_ttl,
+                                     resolver=resolver)
+    return aiohttp.ClientSession(connector=connector,
+                                 trace_configs=[connection_stats.trace_config(), timing_trace_config()])
+
+
+TransportResponse = namedtuple('TransportResponse', ['status', 'headers', 'body'])
+
+
+class Transport:
+    async def request(self, method, url, params=None, headers=None, json=None, auth=None, timeout=None,
+                      timing=None):
+        raise NotImplementedError
+
+    async def warm_up(self, url):
+        raise NotImplementedError
+
+    async def close(self):
+        raise NotImplementedError
+
+
+@dataclass
+class AiohttpTransport(Transport):
+    session: aiohttp.ClientSession
+
+    async def request(self, method, url, params=None, headers=None, json=None, auth=None, timeout=None,
+                      timing=None):
+        try:
+            async with self.session.request(method, url, params=params, headers=headers, json=json,
+                                            timeout=timeout, auth=auth, trace_request_ctx=timing) as resp:
+                body = await resp.read()
+                if timing:
+                    timing.end('transfer')
+                return TransportResponse(resp.status, resp.headers, body)
+        except asyncio.TimeoutError:
+            # aiohttp.ServerTimeoutError is a connection error too, keep it a timeout
+            raise
+        except aiohttp.ClientError as e:
+            # Includes ClientPayloadError for bodies cut off before Content-Length
+            raise ConnectionError(e) from e
+
+    async def warm_up(self, url):
+        try:
+            async with self.session.head(url, allow_redirects=False, timeout=5):
+                pass
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+
+    async def close(self):
+        await self.session.close()
+
+
+@dataclass
+class HttpxTransport(Transport):
+    client: 'httpx.AsyncClient'
+
+    async def request(self, method, url, params=None, headers=None, json=None, auth=None, timeout=None,
+                      timing=None):
+        if timing:
+            timing.start = monotonic()
+            timing.begin('ttfb')
+        try:
+            async with self.client.stream(method, url, params=params, headers=headers, json=json,
+                                          auth=(auth.login, auth.password) if auth else None, timeout=timeout) as resp:
+                if timing:
+                    timing.end('ttfb')
+                    timing.begin('transfer')
+                body = await resp.aread()
+                if timing:
+                    timing.end('transfer')
+                    timing.size = resp.num_bytes_downloaded
+                return TransportResponse(resp.status_code, resp.headers, body)
+        except httpx.TimeoutException as e:
+            raise asyncio.TimeoutError() from e
+        except httpx.TransportError as e:
+            raise ConnectionError(e) from e
+
+    async def warm_up(self, url):
+        try:
+            await self.client.head(url, timeout=5)
+        except httpx.HTTPError:
+            pass
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_transport(config, connection_stats):
+    if config.get('global', 'transport', fallback='aiohttp') == 'httpx':
+        if httpx is None:
+            print('httpx is not installed, falling back to aiohttp')
+        else:
+            limits = httpx.Limits(max_connections=config.getint('global', 'connections', fallback=100),
+                                  keepalive_expiry=config.getint('global', 'keepalive_timeout', fallback=30))
+            try:
+                return HttpxTransport(httpx.AsyncClient(http2=True, limits=limits))
+            except ImportError:
+                print('h2 is not installed, falling back to aiohttp')
+    return AiohttpTransport(create_session(config, connection_stats))
+
+
+def warm_up(transport, config, sections):
+    # Open DNS, TCP and TLS to every configured system while credentials are loaded
+    return [asyncio.ensure_future(transport.warm_up(config.get(section, 'url')))
+            for section in sections if config.has_option(section, 'url')]
+
+
+@dataclass
+class SecretCache:
+    path: str
+    ttl: float = 0.0
+    secrets: Dict = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        if self.ttl <= 0:
+            # Secrets cached while the session cache was on must not outlive it
+            self.write({})
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                session = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        now = datetime.now().timestamp()
+        valid = {key: value for key, value in session.items() if value.get('expires_at', 0) > now}
+        if len(valid) < len(session):
+            # Expired secrets are removed from disk, not just ignored
+            self.write(valid)
+        return valid
+
+    def write(self, session):
+        if not session:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            return
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Secrets in plain text must stay readable by the owner only
+            with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+                json.dump(session, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def save(self, key, secret):
+        with self.lock:
+            session = self.load()
+            session[key] = {'secret': secret, 'expires_at': datetime.now().timestamp() + self.ttl}
+            self.write(session)
+
+    def get_password(self, service, username):
+        key = f'{service}:{username}'
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        # Lookups of different secrets run in parallel, repeated ones wait for the first
+        with key_lock:
+            if key not in self.secrets:
+                cached = None
+                if self.ttl > 0:
+                    with self.lock:
+                        cached = self.load().get(key)
+                if cached:
+                    self.secrets[key] = cached['secret']
+                else:
+                    self.secrets[key] = keyring.get_password(service, username)
+                    if self.ttl > 0 and self.secrets[key] is not None:
+                        self.save(key, self.secrets[key])
+            return self.secrets[key]
+
+
+secret_caches = {}
+
+
+def get_password(config, service, username):
+    # Memoized for the process lifetime, optionally shared between runs for secret_cache_ttl seconds
+    path = os.path.join(get_cache_dir(config), 'secrets.json')
+    if path not in secret_caches:
+        # Systems are created in worker threads, setdefault keeps the first cache
+        secret_caches.setdefault(path, SecretCache(path, ttl=config.getfloat('global', 'secret_cache_ttl',
+                                                                             fallback=0.0)))
+    return secret_caches[path].get_password(service, username)
+
+
+async def create_systems(classes, *args, **kwargs):
+    # Keyring lookups in __post_init__ block, so systems are created in worker threads
+    loop = asyncio.get_running_loop()
+    return list(await asyncio.gather(*(loop.run_in_executor(None, partial(cls, *args, **kwargs)) for cls in classes)))
+
+
+Response = namedtuple('Response', ['json', 'headers'])
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def get_retry_after(headers):
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class RetryPolicy:
+    max_retries: int = 5
+    budget: int = 10
+    backoff: float = 0.5
+    max_backoff: float = 30.0
+    retries: int = 0
+    backoff_time: float = 0.0
+
+    def can_retry(self, attempt):
+        return attempt < self.max_retries and self.retries < self.budget
+
+    def get_delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def wait(self, delay):
+        self.retries += 1
+        started = monotonic()
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            # The report deadline may cut the sleep short
+            self.backoff_time += monotonic() - started
+
+    def __str__(self):
+        return f'{self.retries} retries, {self.backoff_time:.1f}s backoff'
+
+
+@dataclass
+class RateLimiter:
+    rate: float = 10.0
+    capacity: float = 10.0
+    tokens: float = 10.0
+    wait_time: float = 0.0
+    updated: float = field(default_factory=monotonic)
+    lock: asyncio.Lock = None
+
+    def refill(self):
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        # Lock is created lazily to bind it to the running event loop
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            self.refill()
+            if self.tokens < 1:
+                delay = (1 - self.tokens) / self.rate
+                self.wait_time += delay
+                await asyncio.sleep(delay)
+                self.refill()
+            self.tokens -= 1
+
+    def update(self, headers):
+        limit = headers.get('X-RateLimit-Total') or headers.get('X-RateLimit-Limit')
+        remaining = headers.get('X-RateLimit-Remaining')
+        interval = headers.get('X-RateLimit-Interval-Seconds', 60)
+        try:
+            if limit:
+                self.rate = int(limit) / float(interval)
+                self.capacity = max(1.0, self.rate)
+            if remaining:
+                self.refill()
+                self.tokens = min(self.tokens, float(remaining))
+        except ValueError:
+            pass
+
+    def throttle(self):
+        self.rate = max(0.1, self.rate / 2)
+        self.tokens = min(self.tokens, 0.0)
+
+    def __str__(self):
+        return f'rate {self.rate:.1f}/s, {self.tokens:.1f} tokens, {self.wait_time:.1f}s waited'
+
+
+@dataclass
+class LatencyHistogram:
+    # Bucket upper bounds grow by 2 ** 0.25 from 1 ms to about 65 s
+    counts: List[int] = field(default_factory=lambda: [0] * 65)
+    total: int = 0
+
+    def add(self, seconds):
+        bucket = math.ceil(4 * math.log2(max(seconds * 1000, 1)))
+        self.counts[min(bucket, len(self.counts) - 1)] += 1
+        self.total += 1
+
+    def percentile(self, percent, min_samples=10):
+        if self.total < min_samples:
+            return None
+        rank = self.total * percent / 100
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return 2 ** (bucket / 4) / 1000
+
+    def __str__(self):
+        p50, p95 = self.percentile(50, 1), self.percentile(95, 1)
+        if p50 is None:
+            return 'no latency samples'
+        return f'p50 {p50 * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms'
+
+
+rate_limiters = {}
+latency_histograms = {}
+circuit_breakers = {}
+in_flight = {}
+
+
+@dataclass
+class InFlight:
+    future: asyncio.Future
+    waiters: int = 0
+
+
+def forget_in_flight(key, flight, _):
+    if in_flight.get(key) is flight:
+        del in_flight[key]
+
+
+CachedResponse = namedtuple('CachedResponse', ['headers', 'body'])
+
+
+@dataclass
+class ResponseCache:
+    path: str
+    max_size: int = 50 * 1024 * 1024
+
+    def __post_init__(self):
+        os.makedirs(self.path, exist_ok=True)
+
+    def get_path(self, key):
+        return os.path.join(self.path, hashlib.sha256(repr(key).encode()).hexdigest())
+
+    def get(self, key):
+        path = self.get_path(key)
+        try:
+            with open(path, 'rb') as f:
+                headers = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        # File modification time is the LRU clock
+        os.utime(path)
+        return CachedResponse(CIMultiDict((name, value) for name, value in headers), body)
+
+    def put(self, key, headers, body):
+        path = self.get_path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(json.dumps(list(headers.items())).encode() + b'\n')
+                f.write(body)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        self.evict()
+
+    def evict(self):
+        files = []
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum(file_size for _, file_size, _ in files)
+        for _, file_size, path in sorted(files):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                size -= file_size
+            except OSError:
+                pass
+
+
+def get_cache_dir(config):
+    return os.path.expanduser(config.get('global', 'cache_dir', fallback='~/.cache/timer'))
+
+
+@dataclass
+class EntryStore:
+    path: str
+    connection: sqlite3.Connection = field(init=False)
+
+    def __post_init__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=10)
+        # WAL lets concurrent runs read while another one writes
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS entries (
+                system TEXT NOT NULL,
+                entry_id TEXT NOT NULL,
+                day TEXT NOT NULL,
+                ticket TEXT,
+                billable INTEGER NOT NULL,
+                seconds REAL NOT NULL,
+                note TEXT,
+                position INTEGER NOT NULL,
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (system, entry_id));
+            CREATE INDEX IF NOT EXISTS entries_report ON entries (day, system, billable);
+            CREATE TABLE IF NOT EXISTS syncs (
+                system TEXT NOT NULL,
+                day TEXT NOT NULL,
+                complete INTEGER NOT NULL,
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (system, day));
+            CREATE TABLE IF NOT EXISTS cursors (
+                system TEXT PRIMARY KEY,
+                value INTEGER NOT NULL);
+        ''')
+
+    def upsert(self, system, entries, synced_at=None):
+        # Entries are (day, position, entry) tuples
+        synced_at = synced_at or datetime.now().timestamp()
+        rows = [(system, str(entry.uid if entry.uid is not None else f'{entry.id}:{position}'), day, entry.id,
+                 int(bool(entry.billable)), entry.spent.seconds, entry.note, position, synced_at)
+                for day, position, entry in entries]
+        # Every column is written, so REPLACE works as an upsert on SQLite older than 3.24
+        self.connection.executemany('''
+            INSERT OR REPLACE INTO entries
+                (system, entry_id, day, ticket, billable, seconds, note, position, synced_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+        return rows
+
+    def delete(self, system, entry_ids):
+        with self.connection:
+            self.connection.executemany('DELETE FROM entries WHERE system = ? AND entry_id = ?',
+                                        [(system, str(entry_id)) for entry_id in entry_ids])
+
+    def save(self, system, day, entries, complete=True):
+        synced_at = datetime.now().timestamp()
+        with self.connection:
+            rows = self.upsert(system, [(day, position, entry) for position, entry in enumerate(entries)], synced_at)
+            # Only a complete fetch proves that missing entries were deleted upstream,
+            # and only its time tells how fresh the stored day is
+            if complete:
+                self.connection.execute(f'''
+                    DELETE FROM entries WHERE system = ? AND day = ?
+                    AND entry_id NOT IN ({', '.join('?' * len(rows))})''', [system, day, *(row[1] for row in rows)])
+                self.connection.execute('''
+                    INSERT OR REPLACE INTO syncs (system, day, complete, synced_at) VALUES (?, ?, 1, ?)''',
+                                        (system, day, synced_at))
+
+    def get_sync(self, system, day):
+        return self.connection.execute('''
+            SELECT complete, synced_at FROM syncs WHERE system = ? AND day = ?''', (system, day)).fetchone()
+
+    def is_synced(self, system, day):
+        sync = self.get_sync(system, day)
+        return bool(sync and sync[0])
+
+    def get_cursor(self, system):
+        row = self.connection.execute('SELECT value FROM cursors WHERE system = ?', (system,)).fetchone()
+        return row[0] if row else None
+
+    def set_cursor(self, system, value):
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO cursors (system, value) VALUES (?, ?)', (system, value))
+
+    def get_spent(self, system, day, billable):
+        row = self.connection.execute('''
+            SELECT COALESCE(SUM(seconds), 0) FROM entries WHERE day = ? AND system = ? AND billable = ?''',
+                                      (day, system, int(billable))).fetchone()
+        return Time(row[0])
+
+    def get_entries(self, system, day):
+        rows = self.connection.execute('''
+            SELECT ticket, billable, seconds, note, entry_id FROM entries WHERE day = ? AND system = ?
+            ORDER BY position''', (day, system))
+        return [Entry(id=ticket, billable=bool(billable), spent=Time(seconds), note=note, uid=entry_id)
+                for ticket, billable, seconds, note, entry_id in rows]
+
+    def close(self):
+        self.connection.close()
+
+
+def is_locked(config, report_date):
+    # Days older than the lock horizon are considered closed and never change
+    lock_horizon = config.getint('global', 'lock_horizon', fallback=None)
+    return lock_horizon is not None and report_date.date() < date.today() - timedelta(days=lock_horizon)
+
+
+def create_store(config):
+    if not config.getboolean('global', 'store', fallback=True):
+        return None
+    try:
+        return EntryStore(os.path.join(get_cache_dir(config), 'entries.sqlite3'))
+    except (OSError, sqlite3.Error) as e:
+        print(colored(f'Local store is disabled: {e}', 'yellow'))
+        return None
+
+
+def create_cache(config):
+    max_size = config.getint('global', 'cache_size', fallback=50) * 1024 * 1024
+    try:
+        return ResponseCache(os.path.join(get_cache_dir(config), 'http'), max_size)
+    except OSError as e:
+        print(colored(f'Response cache is disabled: {e}', 'yellow'))
+        return None
+
+
+@dataclass
+class CircuitBreaker:
+    path: str
+    name: str
+    threshold: int = 3
+    cooldown: float = 300.0
+    failures: int = 0
+    opened_at: float = 0.0
+    probing: bool = False
+
+    def __post_init__(self):
+        state = self.load().get(self.name, {})
+        self.failures = state.get('failures', 0)
+        self.opened_at = state.get('opened_at', 0.0)
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        # State is shared between runs, so other backends' records are kept
+        state = self.load()
+        state[self.name] = {'failures': self.failures, 'opened_at': self.opened_at}
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def is_open(self):
+        return self.failures >= self.threshold and self.get_cooldown_left() > 0
+
+    def get_cooldown_left(self):
+        return max(0.0, self.opened_at + self.cooldown - datetime.now().timestamp())
+
+    def allow(self):
+        if self.failures < self.threshold:
+            return True
+        if self.is_open() or self.probing:
+            return False
+        # Half-open: let a single probe request through
+        self.probing = True
+        return True
+
+    def record_success(self):
+        self.probing = False
+        if self.failures:
+            self.failures = 0
+            self.save()
+
+    def record_failure(self):
+        self.probing = False
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = datetime.now().timestamp()
+        self.save()
+
+    def __str__(self):
+        if self.is_open():
+            return f'circuit open after {self.failures} failures, retry in {self.get_cooldown_left():.0f}s'
+        return f'circuit closed, {self.failures} failures'
+
+
+def parse_link_header(value):
+    links = {}
+    for link in value.split(','):
+        match = re.match(r'''\s*<([^>]*)>\s*;.*rel="?([^";]+)"?''', link)
+        if match:
+            links[match.group(2)] = match.group(1)
+    return links
 
 
 @dataclass
@@ -112,6 +856,11 @@ class TicketingSystem:
     report_date: datetime = datetime.today()
     json: Dict = None
     entries: List[Entry] = field(default_factory=list)
+    transport: Transport = None
+    cache: ResponseCache = None
+    store: EntryStore = None
+    refresh: bool = False
+    offline: bool = False
     auth: Tuple[str] = field(init=False)
     params: Dict[str, str] = field(init=False)
     url: str = field(init=False)
@@ -119,6 +868,44 @@ class TicketingSystem:
     entry_url: str = field(init=False)
     max_retries: int = field(init=False, default=5)
     timeout: int = field(init=False, default=5)
+    retry: RetryPolicy = field(init=False)
+    rate_limiter: RateLimiter = field(init=False)
+    coalesced: int = field(init=False, default=0)
+    incomplete: bool = field(init=False, default=False)
+    latency: LatencyHistogram = field(init=False)
+    requests: int = field(init=False, default=0)
+    hedged: int = field(init=False, default=0)
+    breaker: CircuitBreaker = field(init=False)
+    skipped: bool = field(init=False, default=False)
+    timings: List[RequestTiming] = field(init=False, default_factory=list)
+    errors: int = field(init=False, default=0)
+    cached_at: datetime = field(init=False, default=None)
+    stored_at: datetime = field(init=False, default=None)
+    never_synced: bool = field(init=False, default=False)
+    failed: str = field(init=False, default=None)
+
+    def __post_init__(self):
+        section = self.section = self.__class__.__name__.lower()
+        # Subclasses may shift report_date to another timezone, the stored day stays local
+        self.day = self.report_date.strftime('%Y-%m-%d')
+        self.locked = is_locked(self.config, self.report_date)
+        self.retry = RetryPolicy(max_retries=self.config.getint(section, 'max_retries', fallback=self.max_retries),
+                                 budget=self.config.getint(section, 'retry_budget', fallback=10),
+                                 backoff=self.config.getfloat(section, 'retry_backoff', fallback=0.5))
+        # One limiter per backend, shared by all its instances
+        if section not in rate_limiters:
+            rate = self.config.getfloat(section, 'rate_limit', fallback=10.0)
+            rate_limiters[section] = RateLimiter(rate=rate, capacity=rate, tokens=rate)
+        self.rate_limiter = rate_limiters[section]
+        self.latency = latency_histograms.setdefault(section, LatencyHistogram())
+        self.hedge = self.config.getboolean(section, 'hedge', fallback=False)
+        self.hedge_budget = self.config.getfloat(section, 'hedge_budget', fallback=10.0)
+        if section not in circuit_breakers:
+            circuit_breakers[section] = CircuitBreaker(
+                os.path.join(get_cache_dir(self.config), 'breakers.json'), section,
+                threshold=self.config.getint(section, 'breaker_threshold', fallback=3),
+                cooldown=self.config.getfloat(section, 'breaker_cooldown', fallback=300.0))
+        self.breaker = circuit_breakers[section]
 
     def __str__(self):
         res = []
@@ -131,43 +918,237 @@ class TicketingSystem:
     def __repr__(self):
         return __name__ + self.__str__()
 
-    async def get_json(self):
-        async with aiohttp.ClientSession() as session:
+    async def get_response(self, url=None, params=None, method='GET', body=None):
+        if url is None:
+            url, params = self.api_url, self.params
+        if method not in IDEMPOTENT_METHODS:
+            response = await self.request(url, params, method, body)
+        else:
+            # Identical concurrent requests share one in-flight future
+            key = (method, url, tuple(sorted((params or {}).items())), self.auth)
+            flight = in_flight.get(key)
+            if flight is None:
+                flight = in_flight[key] = InFlight(asyncio.ensure_future(self.request(url, params, method)))
+                flight.future.add_done_callback(partial(forget_in_flight, key, flight))
+            else:
+                self.coalesced += 1
+            flight.waiters += 1
+            try:
+                response = await asyncio.shield(flight.future)
+            finally:
+                flight.waiters -= 1
+                # Stop retrying once nobody waits for the answer, e.g. after the report deadline
+                if not flight.waiters and not flight.future.done():
+                    forget_in_flight(key, flight, None)
+                    flight.future.cancel()
+        if response is None:
+            self.errors += 1
+        return response
+
+    async def request(self, url, params, method, body=None):
+        if not self.breaker.allow():
+            return None
+        try:
+            response = await self.request_with_retries(url, params, method, body)
+        except asyncio.CancelledError:
+            # Cancelled requests say nothing about the system health
+            self.breaker.probing = False
+            raise
+        if response:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        return response
+
+    async def request_with_retries(self, url, params, method, body=None):
+        cache_key = (method, url, tuple(sorted((params or {}).items())), self.auth)
+        cached = self.cache.get(cache_key) if self.cache and method == 'GET' else None
+        headers = {}
+        if cached:
+            if 'ETag' in cached.headers:
+                headers['If-None-Match'] = cached.headers['ETag']
+            if 'Last-Modified' in cached.headers:
+                headers['If-Modified-Since'] = cached.headers['Last-Modified']
+
+        attempt = 0
+        while True:
+            retry_after = None
+            await self.rate_limiter.acquire()
+            self.requests += 1
+            started = monotonic()
+            timing = RequestTiming(url)
+            self.timings.append(timing)
             try:
-                async with session.get(self.api_url, params=self.params, timeout=self.timeout, auth=self.auth) as resp:
-                    return await resp.json()
+                resp = await self.transport.request(method, url, params=params, headers=headers, json=body,
+                                                    auth=self.auth, timeout=self.timeout, timing=timing)
             except asyncio.TimeoutError:
-                print(f'Got timeout while getting {self.__class__.__name__}')
+                error = 'timeout'
+            except ConnectionError as e:
+                error = f'connection error ({e})'
+            else:
+                self.latency.add(monotonic() - started)
+                self.rate_limiter.update(resp.headers)
+                if resp.status == 304 and cached:
+                    return self.decode(cached.body, cached.headers)
+                if resp.status not in RETRY_STATUSES:
+                    if self.cache and method == 'GET' and resp.status == 200 and (
+                            'ETag' in resp.headers or 'Last-Modified' in resp.headers):
+                        self.cache.put(cache_key, resp.headers, resp.body)
+                    return self.decode(resp.body, resp.headers)
+                error = f'HTTP {resp.status}'
+                if resp.status == 429:
+                    self.rate_limiter.throttle()
+                if resp.status in (429, 503):
+                    retry_after = get_retry_after(resp.headers)
+
+            if method not in IDEMPOTENT_METHODS or not self.retry.can_retry(attempt):
+                print(f'Got {error} while getting {self.__class__.__name__}')
+                return None
+            await self.retry.wait(self.retry.get_delay(attempt, retry_after))
+            attempt += 1
+
+    def decode(self, body, headers):
+        try:
+            return Response(json_loads(body) if body else None, headers)
+        except ValueError:
+            print(f'Got invalid JSON while getting {self.__class__.__name__}')
+
+    async def get_json(self, url=None, params=None, method='GET', body=None):
+        response = await self.get_response(url, params, method, body)
+        if response:
+            return response.json
+
+    async def get_hedged_json(self, url, params=None):
+        threshold = self.latency.percentile(95)
+        if not self.hedge or threshold is None:
+            return await self.get_json(url, params)
+
+        primary = asyncio.ensure_future(self.get_response(url, params))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait([primary], timeout=threshold)
+            if done or self.hedged >= self.requests * self.hedge_budget / 100:
+                response = await primary
+                return response.json if response else None
+
+            # Straggler: send a duplicate past request coalescing and keep the first answer
+            self.hedged += 1
+            tasks.append(asyncio.ensure_future(self.request(url, params, 'GET')))
+            pending = set(tasks)
+            response = None
+            while pending and not response:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    response = response or task.result()
+            return response.json if response else None
+        finally:
+            # Also reached when the report deadline cancels us while waiting
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
 
     async def get_entries(self):
         raise NotImplementedError
 
+    def get_frozen_entries(self):
+        if self.locked and not self.refresh and self.store and self.store.is_synced(self.section, self.day):
+            self.entries = self.store.get_entries(self.section, self.day)
+            self.cached_at = datetime.fromtimestamp(self.store.get_sync(self.section, self.day)[1])
+            return True
+        return False
+
+    def get_stored_entries(self):
+        if not self.store:
+            return
+        entries = self.store.get_entries(self.section, self.day)
+        if self.store.is_synced(self.section, self.day):
+            self.entries = entries
+            self.stored_at = datetime.fromtimestamp(self.store.get_sync(self.section, self.day)[1])
+        elif entries:
+            # Left by incomplete fetches only, so there is no age to show
+            self.entries = entries
+            self.never_synced = True
+
+    async def get_entries_until(self, timeout):
+        if self.get_frozen_entries():
+            return self
+        if self.offline:
+            self.get_stored_entries()
+            return self
+        if self.breaker.is_open():
+            self.skipped = True
+        else:
+            try:
+                await asyncio.wait_for(self.get_entries(), timeout)
+            except asyncio.TimeoutError:
+                self.incomplete = True
+            if self.store:
+                self.store.save(self.section, self.day, self.entries, complete=not (self.incomplete or self.errors))
+        if self.incomplete or self.skipped or self.errors:
+            # Show what earlier runs stored instead of a partial answer
+            self.get_stored_entries()
+        return self
+
     def get_bill(self):
+        if self.store:
+            return self.store.get_spent(self.section, self.day, billable=True)
         time = Time(sum(i.spent.seconds for i in self.entries if i.billable))
         return time
 
     def get_free(self):
+        if self.store:
+            return self.store.get_spent(self.section, self.day, billable=False)
         time = Time(sum(i.spent.seconds for i in self.entries if not i.billable))
         return time
 
     def get_total(self):
         return self.get_bill() + self.get_free()
 
+    def fail(self, error):
+        self.failed = str(error) or error.__class__.__name__
+        self.get_stored_entries()
+
     def print_if_not_empty(self):
         if self.entries:
             print(self)
+        if self.failed:
+            print(colored(f'{self.__class__.__name__} failed: {self.failed}', 'red'))
+        elif self.errors:
+            print(colored(f'{self.__class__.__name__} has errors: requests failed after retries ({self.errors})',
+                          'red'))
+        if self.incomplete:
+            print(colored(f'{self.__class__.__name__} is incomplete: report deadline exceeded', 'yellow'))
+        if self.skipped:
+            print(colored(f'{self.__class__.__name__} is skipped: {self.breaker}', 'yellow'))
+        if self.cached_at:
+            print(colored(f'{self.__class__.__name__} is cached: closed day fetched '
+                          f'at {self.cached_at:%d.%m.%Y %H:%M}', 'cyan'))
+        if self.stored_at:
+            print(colored(f'{self.__class__.__name__} is stored: entries fetched {self.get_age()} ago '
+                          f'at {self.stored_at:%d.%m.%Y %H:%M}', 'yellow'))
+        elif self.never_synced:
+            print(colored(f'{self.__class__.__name__} is stored: entries were never fully fetched', 'yellow'))
+        elif self.offline and not self.cached_at:
+            print(colored(f'{self.__class__.__name__} is offline: no stored entries for this day', 'yellow'))
+        elif self.incomplete or self.skipped or self.errors or self.failed:
+            print(colored(f'{self.__class__.__name__} has no stored entries to fall back to', 'yellow'))
+
+    def get_age(self):
+        return Time((datetime.now() - self.stored_at).total_seconds())
 
 
 @dataclass
 class Freshdesk(TicketingSystem):
     # FIXME someday in must become async and include self.json = self.get.json() initialisation
     def __post_init__(self):
+        super().__post_init__()
         local = pytz.timezone(self.config.get('global', 'timezone'))
         local_dt = local.localize(self.report_date)
         utc_dt = local_dt.astimezone(pytz.utc)
         self.report_date = utc_dt - timedelta(seconds=1)
         self.agent_id = self.config.get('freshdesk', 'agent_id')
-        self.auth = aiohttp.BasicAuth(keyring.get_password('freshdesk', self.agent_id), 'X')
+        self.auth = None if self.offline else aiohttp.BasicAuth(get_password(self.config, 'freshdesk', self.agent_id),
+                                                                'X')
         self.params = {'agent_id': self.agent_id,
                        'executed_after': self.report_date.strftime('%Y-%m-%dT%H:%M:%SZ'),
                        'executed_before': (self.report_date + timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%SZ')}
@@ -176,107 +1157,284 @@ class Freshdesk(TicketingSystem):
         self.entry_url = self.url + '/a/tickets/'
         self.free_tags = self.config.get('freshdesk', 'free_tags').split()
 
-    def __parse_json__(self):
-        if self.json:
-            data = sorted(self.json, key=lambda k: (k.get('ticket_id'), k.get('updated_at')))
-            self.entries = [Entry(id=i.get('ticket_id'),
-                                  billable=i.get('billable'),
-                                  spent=Time.from_string(i.get('time_spent')),
-                                  note=i.get('note'))
-                            for i in data]
-
-            if self.free_tags:
-                for entry in self.entries:
-                    if entry.billable:
-                        if any(tag in entry.note for tag in self.free_tags):
-                            entry.note += colored(' Warn! Billable entry with free tag!', 'red')
-                    else:
-                        if all(tag not in entry.note for tag in self.free_tags):
-                            entry.note += colored(' Warn! Free entry without free tag!', 'red')
+    def __parse_entry__(self, data):
+        entry = Entry(id=data.get('ticket_id'),
+                      billable=data.get('billable'),
+                      spent=Time.from_string(data.get('time_spent')),
+                      note=data.get('note'),
+                      uid=data.get('id'))
+        if self.free_tags:
+            if entry.billable:
+                if any(tag in entry.note for tag in self.free_tags):
+                    entry.note += colored(' Warn! Billable entry with free tag!', 'red')
+            else:
+                if all(tag not in entry.note for tag in self.free_tags):
+                    entry.note += colored(' Warn! Free entry without free tag!', 'red')
+        return entry
+
+    async def __parse_json__(self, pages):
+        entries = []
+        try:
+            async for page in pages:
+                entries.extend(((i.get('ticket_id'), i.get('updated_at')), self.__parse_entry__(i)) for i in page)
+        finally:
+            # Keep entries parsed so far if the report deadline cancels us
+            entries.sort(key=lambda k: k[0])
+            self.entries = [entry for _, entry in entries]
+
+    async def get_pages(self):
+        url, params = self.api_url, {**(self.params or {}), 'per_page': 100}
+        while url:
+            response = await self.get_response(url, params)
+            if not response:
+                return
+            yield response.json
+            # Next page link already carries all query params
+            url, params = parse_link_header(response.headers.get('Link', '')).get('next'), None
 
     async def get_entries(self):
-        self.json = await self.get_json()
-        self.__parse_json__()
+        await self.__parse_json__(self.get_pages())
         return self
 
     async def get_ticket(self, ticket_num):
         self.api_url = f'''{self.config.get('freshdesk', 'url')}/api/v2/tickets/{ticket_num}/time_entries'''
         self.params = None
-        self.json = await self.get_json()
-        self.__parse_json__()
+        # Long-running tickets have thousands of entries, so only the totals are kept
+        bill, free = Time(0), Time(0)
+        async for page in self.get_pages():
+            for data in page:
+                entry = self.__parse_entry__(data)
+                if entry.billable:
+                    bill += entry.spent
+                else:
+                    free += entry.spent
 
         return (f'''Time records for ticket {ticket_num}:
-        Total: {self.get_total()}
-        Bill:  {self.get_bill()}
-        Free:  {self.get_free()}
+        Total: {bill + free}
+        Bill:  {bill}
+        Free:  {free}
         ''')
 
 
 @dataclass
 class TeamWork(TicketingSystem):
     def __post_init__(self):
+        super().__post_init__()
         self.agent_id = self.config.get('teamwork', 'agent_id')
-        self.auth = aiohttp.BasicAuth(keyring.get_password('teamwork', self.agent_id), 'x')
+        self.concurrency = self.config.getint('teamwork', 'concurrency', fallback=4)
+        self.auth = None if self.offline else aiohttp.BasicAuth(get_password(self.config, 'teamwork', self.agent_id),
+                                                                'x')
         self.url = self.config.get('teamwork', 'url')
-        self.api_url = self.url + '/time_entries.json'
+        self.api_url = self.url + '/projects/api/v3/time.json'
         self.entry_url = self.url + '/#tasks/'
         self.params = {
-            'userId': self.config.get('teamwork', 'agent_id'),
-            'fromdate': self.report_date.strftime('%Y%m%d'),
-            'todate': self.report_date.strftime('%Y%m%d')
+            'assignedToUserIds': self.agent_id,
+            'startDate': self.report_date.strftime('%Y-%m-%d'),
+            'endDate': self.report_date.strftime('%Y-%m-%d'),
+            'pageSize': self.config.getint('teamwork', 'page_size', fallback=250),
+            # Sparse fieldsets: only what the report shows, with project and task names sideloaded
+            'fields[timelogs]': 'id,minutes,isBillable,timeLogged,taskId,projectId',
+            'fields[projects]': 'id,name',
+            'fields[tasks]': 'id,name',
+            'include': 'projects,tasks',
         }
 
+    def __parse_json__(self, data):
+        included = data.get('included', {})
+        projects = included.get('projects', {})
+        tasks = included.get('tasks', {})
+        entries = []
+        for i in data.get('timelogs', []):
+            project = projects.get(str(i.get('projectId')), {}).get('name', '')
+            task = tasks.get(str(i.get('taskId')), {}).get('name', '')
+            entries.append((i.get('timeLogged'), Entry(id=i.get('taskId'),
+                                                       # v3 gives the whole duration in minutes
+                                                       spent=Time(int(i.get('minutes', 0)) * 60),
+                                                       billable=i.get('isBillable', False),
+                                                       note=f'{project}: {task}' if task else project,
+                                                       uid=i.get('id'))))
+        return entries
+
+    async def get_page(self, page, semaphore):
+        async with semaphore:
+            return await self.get_json(self.api_url, {**self.params, 'page': page})
+
     async def get_entries(self):
-        self.json = await self.get_json()
-        if self.json:
-            data = sorted(self.json.get('time-entries'), key=lambda k: (k.get('date')))
-            self.entries = [Entry(id=i.get('todo-item-id'),
-                                  spent=(Time(int(i.get('hours')) * 3600 + int(i.get('minutes')) * 60)),
-                                  billable=(i.get('isbillable') == 1),
-                                  note=i.get('project-name'))
-                            for i in data]
+        response = await self.get_response()
+        if response:
+            self.json = response.json
+            entries = self.__parse_json__(self.json)
+            semaphore = asyncio.Semaphore(self.concurrency)
+            page_meta = self.json.get('meta', {}).get('page', {})
+            pages = math.ceil(page_meta.get('count', 0) / (page_meta.get('pageSize') or self.params['pageSize']))
+            tasks = [asyncio.ensure_future(self.get_page(page, semaphore)) for page in range(2, pages + 1)]
+            try:
+                for page in asyncio.as_completed(tasks):
+                    data = await page
+                    if data:
+                        entries.extend(self.__parse_json__(data))
+            finally:
+                # Keep entries parsed so far if the report deadline cancels us
+                for task in tasks:
+                    task.cancel()
+                entries.sort(key=lambda k: k[0])
+                self.entries = [entry for _, entry in entries]
         return self
 
 
 @dataclass
 class Jira(TicketingSystem):
     def __post_init__(self):
+        super().__post_init__()
         self.login = self.config.get('jira', 'login')
-        self.auth = aiohttp.BasicAuth(self.login, keyring.get_password('jira', self.login))
+        self.concurrency = self.config.getint('jira', 'concurrency', fallback=8)
+        self.incremental_sync = self.config.getboolean('jira', 'incremental_sync', fallback=False)
+        self.auth = None if self.offline else aiohttp.BasicAuth(self.login,
+                                                                get_password(self.config, 'jira', self.login))
         self.url = self.config.get('jira', 'url')
         self.api_url = self.url + '/rest/api/2/search'
         self.entry_url = self.url + '/browse/'
         self.params = {
             'jql': f'''worklogAuthor=currentUser() and worklogDate={self.report_date.strftime('%Y-%m-%d')}''',
-            'maxResults': 1000,
-            'fields': 'id'}
+            'maxResults': self.config.getint('jira', 'page_size', fallback=100),
+            'fields': 'worklog'}
+
+    def get_worklog_entry(self, issue_id, worklog):
+        time_spent = int(worklog.get('timeSpentSeconds'))
+        return Entry(id=issue_id,
+                     billable=False,
+                     spent=Time(time_spent),
+                     note=worklog.get('comment'),
+                     uid=worklog.get('id'))
+
+    def get_issue_entries(self, issue_id, worklogs):
+        entries = []
+        for worklog in worklogs:
+            if (worklog['author']['name'] == self.login and
+                    worklog['started'].split('T')[0] == self.report_date.strftime('%Y-%m-%d')):
+                entries.append(self.get_worklog_entry(issue_id, worklog))
+        return entries
+
+    async def get_issue(self, url, issue_id, semaphore):
+        async with semaphore:
+            result = await self.get_hedged_json(url)
+            return self.get_issue_entries(issue_id, result['worklogs']) if result else []
+
+    async def get_issue_worklogs(self, issue, semaphore):
+        # Search results embed only the first 20 worklogs of an issue
+        worklog = issue.get('fields', {}).get('worklog', {})
+        worklogs = worklog.get('worklogs', [])
+        if worklog.get('total', 0) > len(worklogs):
+            return await self.get_issue(issue.get('self') + '/worklog', issue.get('key'), semaphore)
+        return self.get_issue_entries(issue.get('key'), worklogs)
+
+    async def get_search_page(self, start_at, semaphore):
+        async with semaphore:
+            page = await self.get_json(self.api_url, {**self.params, 'startAt': start_at})
+            return page.get('issues', []) if page else []
+
+    async def search(self, semaphore):
+        result = await self.get_json()
+        if result:
+            # Response may be shared with coalesced requests, so it is not modified in place
+            issues = list(result.get('issues', []))
+            result = {**result, 'issues': issues}
+            # Server may cap maxResults below the requested page size
+            page_size = result.get('maxResults') or len(issues)
+            if page_size and result.get('total', 0) > len(issues):
+                pages = await asyncio.gather(*(self.get_search_page(start_at, semaphore)
+                                               for start_at in range(len(issues), result['total'], page_size)))
+                for page in pages:
+                    issues.extend(page)
+        return result
+
+    async def get_changed_worklog_ids(self, change, since):
+        ids = []
+        while True:
+            result = await self.get_json(f'{self.url}/rest/api/2/worklog/{change}', {'since': since})
+            if not result:
+                return None, None
+            ids.extend(value['worklogId'] for value in result.get('values', []))
+            since = result.get('until', since)
+            if result.get('lastPage', True):
+                return ids, since
+
+    async def get_issue_keys(self, issue_ids):
+        keys = {}
+        for start in range(0, len(issue_ids), 100):
+            chunk = issue_ids[start:start + 100]
+            result = await self.get_json(self.api_url, {'jql': f'id in ({",".join(chunk)})',
+                                                        'fields': 'key',
+                                                        'maxResults': len(chunk)})
+            if not result:
+                return None
+            for issue in result.get('issues', []):
+                keys[issue['id']] = issue['key']
+        # Issues removed or hidden since the worklog change cannot be linked
+        if any(issue_id not in keys for issue_id in issue_ids):
+            return None
+        return keys
+
+    async def sync_worklogs(self, since):
+        updated, until = await self.get_changed_worklog_ids('updated', since)
+        deleted, _ = await self.get_changed_worklog_ids('deleted', since)
+        if updated is None or deleted is None:
+            return False
+
+        worklogs = []
+        # Bulk endpoint takes at most 1000 ids per request
+        for start in range(0, len(updated), 1000):
+            result = await self.get_json(f'{self.url}/rest/api/2/worklog/list', method='POST',
+                                         body={'ids': updated[start:start + 1000]})
+            if result is None:
+                return False
+            worklogs.extend(worklog for worklog in result if worklog['author']['name'] == self.login)
+
+        keys = await self.get_issue_keys(sorted({str(worklog['issueId']) for worklog in worklogs}))
+        if keys is None:
+            return False
+        with self.store.connection:
+            self.store.upsert(self.section, [
+                (worklog['started'].split('T')[0], 0, self.get_worklog_entry(keys[str(worklog['issueId'])], worklog))
+                for worklog in worklogs])
+        self.store.delete(self.section, deleted)
+        self.store.set_cursor(self.section, until)
+        return True
 
     async def get_entries(self):
-        async def get_issue(url, issue_id):
-            async with aiohttp.ClientSession() as session:
-                try:
-                    async with session.get(url, timeout=self.timeout, auth=self.auth, compress=True) as resp:
-                        result = await resp.json()
-                        for worklog in result['worklogs']:
-                            if (worklog['author']['name'] == self.config.get('jira', 'login') and
-                                    worklog['started'].split('T')[0] == self.report_date.strftime('%Y-%m-%d')):
-                                time_spent = int(worklog.get('timeSpentSeconds'))
-                                self.entries.append(Entry(id=issue_id,
-                                                          billable=False,
-                                                          spent=Time(time_spent),
-                                                          note=worklog.get('comment')))
-                except asyncio.TimeoutError:
-                    print(f'Got timeout while getting {url}')
-
-        self.json = await self.get_json()
+        if self.incremental_sync and self.store:
+            since = self.store.get_cursor(self.section)
+            # Only days fully fetched once can be kept up to date with changes alone
+            if since is not None and self.store.is_synced(self.section, self.day) and await self.sync_worklogs(since):
+                self.entries = sorted(self.store.get_entries(self.section, self.day), key=lambda k: issue_key(k.id))
+                return self
+            if since is None:
+                # Changes from now on are picked up by the next incremental sync
+                self.store.set_cursor(self.section, int(datetime.now().timestamp() * 1000))
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        self.json = await self.search(semaphore)
         if self.json:
-            for issue in self.json.get('issues'):
-                await get_issue(issue.get('self') + '/worklog', issue.get('key'))
+            issues = sorted(self.json.get('issues'), key=lambda k: issue_key(k.get('key')))
+            tasks = [asyncio.ensure_future(self.get_issue_worklogs(issue, semaphore)) for issue in issues]
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                # Keep worklogs fetched so far if the report deadline cancels us
+                self.entries = [entry for task in tasks
+                                if task.done() and not task.cancelled() and not task.exception()
+                                for entry in task.result()]
 
         return self
 
 
-def calc_stats(total_bill_time, total_free_time, time_now, report_date, config, ceil_seconds=5 * 60):
+def issue_key(key):
+    project, _, number = str(key).rpartition('-')
+    return (project, int(number)) if number.isdigit() else (str(key), 0)
+
+
+def calc_stats(total_bill_time, total_free_time, time_now, report_date, config, ceil_seconds=5 * 60,
+               provisional=False, stale=False):
     workday_begin = Time.from_string(config.get('global', 'workday_begin'))
     workday_end = Time.from_string(config.get('global', 'workday_end'))
     launch_begin = Time.from_string(config.get('global', 'launch_begin'))
@@ -309,27 +1467,82 @@ def calc_stats(total_bill_time, total_free_time, time_now, report_date, config,
                                  'total_free_time',
                                  'untracked_time',
                                  'till_end_of_work_time',
-                                 'workday_duration', ])
+                                 'workday_duration',
+                                 'provisional',
+                                 'stale', ])
 
     return stats(total_tracked_time,
                  total_bill_time,
                  total_free_time,
                  untracked_time,
                  till_end_of_work_time,
-                 workday_duration)
+                 workday_duration,
+                 provisional,
+                 stale)
 
 
 def get_stats_str(pool, stats):
     res = [f'Total tracked time: {stats.total_tracked_time}']
     for ts in pool:
         ts_name = ts.__class__.__name__
+        if ts.incomplete:
+            res.append(f'     {ts_name:<8} ' + colored('incomplete', 'yellow'))
+        if ts.skipped:
+            res.append(f'     {ts_name:<8} ' + colored('skipped', 'yellow'))
+        if ts.failed:
+            res.append(f'     {ts_name:<8} ' + colored('failed', 'red'))
+        elif ts.errors:
+            res.append(f'     {ts_name:<8} ' + colored(f'errors: {ts.errors}', 'red'))
+        if ts.cached_at:
+            res.append(f'     {ts_name:<8} ' + colored('cached', 'cyan'))
+        if ts.stored_at:
+            res.append(f'     {ts_name:<8} ' + colored(f'stored {ts.get_age()} ago', 'yellow'))
+        if ts.never_synced:
+            res.append(f'     {ts_name:<8} ' + colored('stored, never fully fetched', 'yellow'))
         ts_bill = ts.get_bill()
         if ts_bill.seconds > 0:
             res.append(f'     {ts_name:<8} bill: {ts_bill}')
         ts_free = ts.get_free()
         if ts_free.seconds > 0:
             res.append(f'     {ts_name:<8} free: {ts_free}')
+        if ts.retry.retries > 0:
+            res.append(f'     {ts_name:<8} {ts.retry}')
+
+    return '\n'.join(res)
+
 
+def get_debug_str(pool, connection_stats):
+    res = [str(connection_stats)]
+    for ts in pool:
+        res.append(f'     {ts.__class__.__name__:<9} {ts.requests} requests, {ts.retry}, {ts.coalesced} coalesced, '
+                   f'{ts.hedged} hedged; {ts.latency}; {ts.rate_limiter}')
+    return '\n'.join(res)
+
+
+def get_timings_str(pool, bar_width: int = 30) -> str:
+    timings = [timing for ts in pool for timing in ts.timings if timing.start]
+    if not timings:
+        return 'No requests were made'
+    first = min(timing.start for timing in timings)
+    scale = bar_width / max(max(timing.start - first + timing.get_total() for timing in timings), 0.001)
+    symbols = {'queue': '.', 'dns': 'd', 'connect': 'c', 'ttfb': '=', 'transfer': '#'}
+
+    res = [f'{"":<10}{"start":>7}' + ''.join(f'{phase:>9}' for phase in PHASES) + f'{"bytes":>9}']
+    for ts in pool:
+        ts_timings = [timing for timing in ts.timings if timing.start]
+        if not ts_timings:
+            continue
+        res.append(ts.__class__.__name__)
+        for timing in ts_timings:
+            bar = ' ' * round((timing.start - first) * scale)
+            bar += ''.join(symbols[phase] * round(getattr(timing, phase) * scale) for phase in PHASES)
+            res.append(f'{"":<10}{(timing.start - first) * 1000:>5.0f}ms'
+                       + ''.join(f'{getattr(timing, phase) * 1000:>7.0f}ms' for phase in PHASES)
+                       + f'{timing.size:>9} {bar:<{bar_width}} {urlsplit(timing.url).path}')
+        res.append(f'{"Total":<17}'
+                   + ''.join(f'{sum(getattr(timing, phase) for timing in ts_timings) * 1000:>7.0f}ms'
+                             for phase in PHASES)
+                   + f'{sum(timing.size for timing in ts_timings):>9}')
     return '\n'.join(res)
 
 
@@ -405,8 +1618,19 @@ async def main():
     parser.add_argument('-c', '--config', default='~/timer.conf', type=str, nargs='?', help='Path to config')
     parser.add_argument('-t', '--ticket', type=int, nargs='?',
                         help='Freshdesk ticker number. If provided, return spent time for the ticket')
+    parser.add_argument('--deadline', type=float,
+                        help='Time budget for the whole report in seconds. Slower systems are shown as incomplete')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Fetch closed days again instead of reading them from disk')
+    parser.add_argument('--no-cache', action='store_true', help='Do not use cached responses')
+    parser.add_argument('--offline', action='store_true', help='Show entries stored by earlier runs without network')
+    parser.add_argument('--timings', action='store_true',
+                        help='Print network timings of every request after the report')
+    parser.add_argument('-d', '--debug', action='store_true', help='Print network statistics after the report')
 
     args = parser.parse_args()
+    if args.offline and args.ticket:
+        parser.error('--offline cannot be used with --ticket: ticket time entries are not stored')
     config = configparser.RawConfigParser()
     config_path = os.path.expanduser(args.config)
     if not os.path.exists(config_path):
@@ -414,10 +1638,34 @@ async def main():
 
     config.read(os.path.expanduser(args.config))
 
+    connection_stats = ConnectionStats()
+    transport = None if args.offline else create_transport(config, connection_stats)
+    warm_up_tasks = []
+    cache = None if args.no_cache or args.offline else create_cache(config)
+    store = create_store(config)
+    try:
+        pool = await report(args, config, transport, cache, store, warm_up_tasks)
+    finally:
+        for task in warm_up_tasks:
+            task.cancel()
+        if transport:
+            await transport.close()
+        if store:
+            store.close()
+
+    if args.timings:
+        print('\n' + get_timings_str(pool))
+    if args.debug:
+        print('\n' + get_debug_str(pool, connection_stats))
+
+
+async def report(args, config, transport, cache, store, warm_up_tasks):
     if args.ticket:
-        fd = Freshdesk(config)
+        warm_up_tasks.extend(warm_up(transport, config, ['freshdesk']))
+        fd, = await create_systems([Freshdesk], config, transport=transport, cache=cache)
         result = await fd.get_ticket(args.ticket)
         print(result)
+        return [fd]
 
     else:
         if args.offset.isdigit():
@@ -437,15 +1685,31 @@ async def main():
             date_str = colored(date_str, 'red')
         print(f'Time records for {date_str}')
 
-        pool = [cls(config, report_date) for cls in TicketingSystem.__subclasses__() if
-                config.has_section(cls.__name__.lower())]
-        tasks = asyncio.as_completed([asyncio.create_task(ts.get_entries()) for ts in pool])
-        for task in tasks:
-            try:
-                ts = await task
+        classes = [cls for cls in TicketingSystem.__subclasses__() if config.has_section(cls.__name__.lower())]
+        # Closed days already on disk need no connections
+        frozen = is_locked(config, report_date) and not args.refresh
+        if not args.offline:
+            warm_up_tasks.extend(warm_up(transport, config, [
+                cls.__name__.lower() for cls in classes
+                if not (frozen and store and store.is_synced(cls.__name__.lower(),
+                                                             report_date.strftime('%Y-%m-%d')))]))
+        pool = await create_systems(classes,
+                                    config, report_date, transport=transport, cache=cache, store=store,
+                                    refresh=args.refresh, offline=args.offline)
+        deadline = args.deadline or config.getfloat('global', 'deadline', fallback=None)
+        pending = {asyncio.create_task(ts.get_entries_until(deadline)): ts for ts in pool}
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                ts = pending.pop(task)
+                try:
+                    task.result()
+                except asyncio.CancelledError:
+                    continue
+                except Exception as e:
+                    # One broken system must not take down the report of the others
+                    ts.fail(e)
                 ts.print_if_not_empty()
-            except asyncio.CancelledError:
-                task.close()
 
         time_now = Time.from_string(datetime.now().strftime('%H:%M'))
 
@@ -456,11 +1720,16 @@ async def main():
                            total_free_time=total_free_time,
                            time_now=time_now,
                            report_date=report_date,
-                           config=config)
+                           config=config,
+                           provisional=any(ts.incomplete or ts.skipped or ts.failed or ts.errors for ts in pool),
+                           stale=any(ts.stored_at or ts.never_synced or ts.offline and not ts.cached_at
+                                     for ts in pool))
 
         print('\n' + get_stats_str(pool, stats))
         print('\n' + get_ratio_str(stats))
-        print(f'''Untracked time: {stats.untracked_time}''')
+        notes = [note for note, flag in (('provisional', stats.provisional), ('possibly stale', stats.stale)) if flag]
+        print(f'''Untracked time: {stats.untracked_time}{f' ({", ".join(notes)})' if notes else ''}''')
+        return pool
 
 
 if __name__ == '__main__':